@@ -4,11 +4,10 @@ import os
 import shutil
 import subprocess
 import webbrowser
-from collections.abc import Generator
+from collections.abc import Callable, Generator, Sequence
 from functools import partial
 
 from curses_utils2.app import App, escape2terminal, input_search, start_curses_app
-from curses_utils2.list3 import List3, ListProto3
 from curses_utils2.text import win_help
 from curses_utils2.win import ask_delete, win_addstr
 
@@ -25,8 +24,10 @@ from .db import (
 )
 from .file_utils import input_file
 from .import_diigo import import_html
+from .record_list import RecordList, RecordListProto
 from .utils import (
     FilterString,
+    LruCache,
     RowString,
     chunkstring,
     int2time,
@@ -58,14 +59,36 @@ HELP = [
     ("Ctrl-G", "Copy Tags to clipboard"),
 ]
 
+# key -> selection move, consecutive keys are handled as one move
+SCROLL_KEYS: dict[int, int] = {
+    curses.KEY_DOWN: 1,
+    ord('j'): 1,
+    ord('J'): 1,
+    curses.KEY_UP: -1,
+    ord('k'): -1,
+    ord('K'): -1,
+}
+
 HEADER_KEYS = ('t', 'm', 'c', 'u')
 HEADER: dict[str, str] = dict(zip(HEADER_KEYS, ('Title', 'ModTime', 'Created', 'URL')))
 
 SORT_UP = '\u2191'
 SORT_DOWN = '\u2193'
 
+# key -> sorted -> column header
+HEADER_SORTED: dict[str, dict[SORTED, str]] = {
+    key: {
+        SORTED.NO: f'{title}:',
+        SORTED.ASC: f'{title}({SORT_DOWN}):',
+        SORTED.DESC: f'{title}({SORT_UP}):',
+    }
+    for key, title in HEADER.items()
+}
+
+RECORD_CACHE_SIZE = 1024
 
-class Main(App, ListProto3):  # pylint: disable=too-many-instance-attributes,too-many-public-methods
+
+class Main(App, RecordListProto):  # pylint: disable=too-many-instance-attributes,too-many-public-methods
     def __init__(self, db: Db, screen):
         super().__init__(screen)
 
@@ -75,8 +98,18 @@ class Main(App, ListProto3):  # pylint: disable=too-many-instance-attributes,too
         curses.init_pair(2, curses.COLOR_RED, curses.COLOR_BLACK)
 
         self.records: list[str] = []  # uuid
+        self.filter_uuids: set[str] | None = None  # found by filter, None: all
+        self.record_cache = LruCache(RECORD_CACHE_SIZE)  # uuid -> Record
+        self.str_cache = LruCache(RECORD_CACHE_SIZE)  # uuid -> list lines
+        self.win2_cache = LruCache(RECORD_CACHE_SIZE)  # uuid -> win2 lines, see record2win()
+        self.uuid2idx: dict[str, int] = {}  # uuid -> index in records
         self.filter = FilterString()
+        # filter of sorted records, None: records changed in place
+        self.records_filter: FilterString | None = None
         self.show_deleted = False
+        self.win_deps_dirty = False
+        self.need_clear = False  # repaint the whole terminal on refresh_all()
+        self.header: str | None = None  # see create_header(), None: sort changed
         self.sort(SORT.LAST_MOD)
 
         # title, last_mod, created, tags
@@ -84,24 +117,38 @@ class Main(App, ListProto3):  # pylint: disable=too-many-instance-attributes,too
         self.row_string2 = RowString(4, 70 - 4)  # indent, tags
 
         self.create_windows()
+        self.keys = self.create_keys()
 
     def sort(self, sortby: SORT):
         self.sortedby = sortby
-        self.records = [r.uuid for r in self.db.sort(sortby, self.show_deleted) if self.filter_record(r)]
-
-    def sort2(self, sortby: SORT):
+        self.header = None
+        self.filter_uuids = self.db.search(self.filter)
+        self.records = list(self.db.sort_uuids(sortby, self.show_deleted, self.filter_uuids))
+        self.index_records()
+        self.records_filter = FilterString()
+        self.records_filter.set(self.filter.filter_string)
+
+    def narrow(self):
+        'the filter narrows records_filter: filter records without sorting'
+        self.filter_uuids = self.db.search(self.filter)
+        self.records = [i for i in self.records if self.filter_record(i)]
+        self.index_records()
+        self.records_filter.set(self.filter.filter_string)  # type: ignore[union-attr]
+
+    def index_records(self):
+        self.uuid2idx = {uuid: i for i, uuid in enumerate(self.records)}
+
+    def sort2(self, sortby: SORT, narrow: bool = False):
         idx = self.win.idx
         uuid = None
         if idx < self.records_len():
             uuid = self.records[idx]
-        self.sort(sortby)
-        # find new index of the record
-        if uuid:
-            g = (i for i, x in enumerate(self.records) if x == uuid)  # generator
-            idx2 = next(g, 0)
+        if narrow:
+            self.narrow()
         else:
-            idx2 = 0
-        self.win.idx = idx2
+            self.sort(sortby)
+        # find new index of the record
+        self.win.idx = self.uuid2idx.get(uuid, 0) if uuid else 0
         self.refresh_all()
 
     def create_windows(self):
@@ -116,6 +163,7 @@ class Main(App, ListProto3):  # pylint: disable=too-many-instance-attributes,too
         '''
         maxy, maxx = self.screen_size
         self.win_header = self.screen.derwin(1, maxx, 0, 0)
+        self.win2_cache.clear()  # lines of another size
 
         rows, cols = (maxy - 6, maxx)
         cols2 = min(cols // 3, 35)
@@ -128,40 +176,70 @@ class Main(App, ListProto3):  # pylint: disable=too-many-instance-attributes,too
         self.win_search = self.screen.derwin(1, maxx - len_, 1, len_)
 
         win = self.screen.derwin(rows, cols1 - 3, 4, 2)
-        self.win = List3(win, self, height=2, current_color=curses.color_pair(1))
+        self.win = RecordList(win, self, height=2, current_color=curses.color_pair(1))
 
         if no_win2:
-            self.win2 = None
+            self.win2 = self.win2_inner = None
         else:
             self.win2 = self.screen.derwin(maxy - 3, cols2, 2, cols1)
+            rows2, cols2 = self.win2.getmaxyx()
+            # inside borders
+            self.win2_inner = self.win2.derwin(rows2 - 2, cols2 - 2, 1, 1)
 
         # status
         self.win3 = self.screen.derwin(1, maxx, maxy - 1, 0)
 
     def refresh_win_deps(self):
-        if not self.win2:
+        # postponed until all pending input is handled
+        self.win_deps_dirty = True
+
+    def update_win_deps(self):
+        self.win_deps_dirty = False
+        if not (win := self.win2_inner):
             return
-        rows, cols = self.win2.getmaxyx()
-        rows -= 2  # -borders
-        cols -= 2  # -borders
-        win = self.win2.derwin(rows, cols, 1, 1)
         win.erase()
         idx = self.win.idx
         if idx < len(self.records):
-            uuid = self.records[idx]
-            r = self.db.get_by_uuid(uuid)
-            record2win(r, win)
-        self.win2.refresh()
+            self.record2win(self.records[idx], win)
+        win.noutrefresh()
+
+    def record2win(self, uuid: str, win):
+        if (lines := self.win2_cache.get(uuid)) is None:
+            if not (r := self.get_by_uuid(uuid)):
+                return
+            rows, cols = win.getmaxyx()
+            lines = record2lines(r, rows, cols)
+            self.win2_cache.put(uuid, lines)
+        for row, s in enumerate(lines):
+            win_addstr(win, row, 0, s)
 
     def del_record(self, i: int):
         if not (uuid := self.get_record(i)):
             return
         if ask_delete(self.screen, color=curses.color_pair(2)):
+            self.invalidate_record(uuid)
             if self.db.mark_del(uuid, True):
                 del self.records[i]
+                self.index_records()
             else:
                 self.status(f'error: {self.db.error}')
-        self.win.refresh()
+        self.win.redraw()
+
+    def get_by_uuid(self, uuid: str) -> Record | None:
+        if (r := self.record_cache.get(uuid)) is None and (r := self.db.get_by_uuid(uuid)):
+            self.record_cache.put(uuid, r)
+        return r
+
+    def invalidate_record(self, uuid: str | None = None):
+        'uuid = None: invalidate all records'
+        if uuid is None:
+            self.record_cache.clear()
+            self.str_cache.clear()
+            self.win2_cache.clear()
+        else:
+            self.record_cache.pop(uuid, None)
+            self.str_cache.pop(uuid, None)
+            self.win2_cache.pop(uuid, None)
 
     def get_record(self, i: int) -> str | None:
         len_ = len(self.records)
@@ -170,27 +248,41 @@ class Main(App, ListProto3):  # pylint: disable=too-many-instance-attributes,too
         return self.records[i]
 
     def get_record_str(self, i: int) -> Generator[str]:
-        if (uuid := self.get_record(i)) and (r := self.db.get_by_uuid(uuid)):
-            yield self.row_string.value(r.title, int2time(r.last_mod), int2time(r.created), r.url)
-            yield self.row_string2.value('', r.tags)
+        if uuid := self.get_record(i):
+            yield from self.record_lines(uuid)
+
+    def get_record_str_batch(self, start: int, count: int) -> list[Sequence[str]]:
+        uuids = self.records[start : start + count]
+        # one query for records not in cache
+        if missing := [i for i in uuids if i not in self.str_cache and i not in self.record_cache]:
+            for uuid, r in self.db.get_by_uuids(missing).items():
+                self.record_cache.put(uuid, r)
+        return [self.record_lines(i) for i in uuids]
+
+    def record_lines(self, uuid: str) -> Sequence[str]:
+        if (lines := self.str_cache.get(uuid)) is None:
+            if not (r := self.get_by_uuid(uuid)):
+                return ()
+            lines = (
+                self.row_string.value(r.title, int2time(r.last_mod), int2time(r.created), r.url),
+                self.row_string2.value('', r.tags),
+            )
+            self.str_cache.put(uuid, lines)
+        return lines
 
     def records_len(self) -> int:
         return len(self.records)
 
-    def filter_record(self, record: Record):
-        return self.filter.found(record.title, record.url, tags=record.tags)
-
-    def create_header(self):
-        headers = []
-        for key2 in HEADER_KEYS:
-            title = HEADER[key2]
-            match is_sorted(key2, self.sortedby):
-                case SORTED.ASC:
-                    headers.append(f'{title}({SORT_DOWN}):')
-                case SORTED.DESC:
-                    headers.append(f'{title}({SORT_UP}):')
-                case SORTED.NO:
-                    headers.append(f'{title}:')
+    def filter_record(self, uuid: str) -> bool:
+        return self.filter_uuids is None or uuid in self.filter_uuids
+
+    def create_header(self) -> str:
+        if self.header is None:
+            self.header = self.create_header2()
+        return self.header
+
+    def create_header2(self) -> str:
+        headers = [HEADER_SORTED[key][is_sorted(key, self.sortedby)] for key in HEADER_KEYS]
         return self.row_string.value(*headers)
 
     def show_header(self):
@@ -199,35 +291,45 @@ class Main(App, ListProto3):  # pylint: disable=too-many-instance-attributes,too
             s += ' - deleted!'
         self.win_header.erase()
         win_addstr(self.win_header, 0, 1, s)
-        self.win_header.refresh()
+        self.win_header.noutrefresh()
+
+    def sigwinch_handler(self, *_):
+        self.need_clear = True
+        super().sigwinch_handler()
 
     def refresh_all(self):
-        self.screen.clear()
+        if self.need_clear:
+            self.need_clear = False
+            self.screen.clear()
+        else:
+            # curses sends only changes
+            self.screen.erase()
 
         self.show_header()
 
         win_addstr(self.screen, 1, 0, self.prompt_search)
-        self.screen.refresh()
+        self.screen.noutrefresh()
 
         self.win_search.erase()
         win_addstr(self.win_search, 0, 0, self.filter.filter_string)
-        self.win_search.refresh()
+        self.win_search.noutrefresh()
 
         maxy, maxx = self.screen_size
         win = self.screen.derwin(maxy - 3, maxx, 2, 0)
         win.erase()
         win_addstr(win, 1, 2, self.create_header())
         win.box()
-        win.refresh()
+        win.noutrefresh()
 
-        self.win.refresh()
+        self.win.redraw()
 
         if self.win2:
             self.win2.erase()
             self.win2.border(0, 0, 0, 0, curses.ACS_TTEE, 0, curses.ACS_BTEE, 0)
-            self.win2.refresh()
+            self.win2.noutrefresh()
 
-        self.refresh_win_deps()
+        self.update_win_deps()
+        curses.doupdate()
 
     def run(self):
         self.refresh_all()
@@ -241,17 +343,18 @@ class Main(App, ListProto3):  # pylint: disable=too-many-instance-attributes,too
         win = self.win3
         win.erase()
         win_addstr(win, 0, 1, s)
-        win.refresh()
+        win.noutrefresh()
 
     def search(self):
         ok, s = input_search(self, self.prompt_search.lstrip())
         if ok:
             self.filter.set(s)
             win_addstr(self.win_search, 0, 0, self.filter.filter_string)
-            self.sort2(self.sortedby)
+            narrow = self.records_filter is not None and self.filter.narrows(self.records_filter)
+            self.sort2(self.sortedby, narrow=narrow)
 
     def run_url(self):
-        if (uuid := self.get_record(self.win.idx)) and (r := self.db.get_by_uuid(uuid)) and r.url:
+        if (uuid := self.get_record(self.win.idx)) and (r := self.get_by_uuid(uuid)) and r.url:
             pass
         else:
             return
@@ -264,7 +367,7 @@ class Main(App, ListProto3):  # pylint: disable=too-many-instance-attributes,too
             self.status(f'Could not load python module "webbrowser" for {r.url=}')
 
     def show_url(self):
-        if (uuid := self.get_record(self.win.idx)) and (r := self.db.get_by_uuid(uuid)):
+        if (uuid := self.get_record(self.win.idx)) and (r := self.get_by_uuid(uuid)):
             pass
         else:
             return
@@ -280,7 +383,7 @@ class Main(App, ListProto3):  # pylint: disable=too-many-instance-attributes,too
             self.status('URL is empty')
 
     def url2clipboard(self):
-        if (uuid := self.get_record(self.win.idx)) and (r := self.db.get_by_uuid(uuid)):
+        if (uuid := self.get_record(self.win.idx)) and (r := self.get_by_uuid(uuid)):
             pass
         else:
             return
@@ -291,7 +394,7 @@ class Main(App, ListProto3):  # pylint: disable=too-many-instance-attributes,too
             self.status('URL is empty')
 
     def title2clipboard(self):
-        if (uuid := self.get_record(self.win.idx)) and (r := self.db.get_by_uuid(uuid)):
+        if (uuid := self.get_record(self.win.idx)) and (r := self.get_by_uuid(uuid)):
             pass
         else:
             return
@@ -302,7 +405,7 @@ class Main(App, ListProto3):  # pylint: disable=too-many-instance-attributes,too
             self.status('Title is empty')
 
     def tags2clipboard(self):
-        if (uuid := self.get_record(self.win.idx)) and (r := self.db.get_by_uuid(uuid)):
+        if (uuid := self.get_record(self.win.idx)) and (r := self.get_by_uuid(uuid)):
             pass
         else:
             return
@@ -312,57 +415,78 @@ class Main(App, ListProto3):  # pylint: disable=too-many-instance-attributes,too
         else:
             self.status('Tags is empty')
 
-    def input_loop(self):  # pylint: disable=too-many-branches,too-many-statements
-        for char_ord in self.getch():
-            char = chr(char_ord)
+    def pending_scroll(self) -> int:
+        'sum of already queued scroll keys, the first other key is pushed back'
+        delta = 0
+        self.screen.nodelay(True)
+        try:
+            while (ch := self.screen.getch()) != -1:
+                if ch not in SCROLL_KEYS:
+                    curses.ungetch(ch)
+                    break
+                delta += SCROLL_KEYS[ch]
+        finally:
+            self.screen.nodelay(False)
+        return delta
+
+    def create_keys(self) -> dict[int, Callable[[], None]]:
+        'key -> handler'
+        return {
+            curses.KEY_DC: lambda: self.del_record(self.win.idx),
+            curses.KEY_IC: lambda: self.insert_record(self.win.idx),
+            ord('e'): lambda: self.edit_record(self.win.idx),  # not using curses
+            ord('s'): self.new_search,
+            ord('L'): self.run_url,
+            ord('I'): self.import_html,
+            ord('D'): self.toggle_deleted,
+            ord('U'): self.show_url,
+            curses.KEY_F1: self.show_help,
+            12: self.url2clipboard,  # ^L
+            20: self.title2clipboard,  # ^T
+            7: self.tags2clipboard,  # ^G
+        }
+
+    def new_search(self):
+        self.filter.set()
+        self.search()
+
+    def toggle_deleted(self):
+        self.show_deleted = not self.show_deleted
+        self.show_header()
+        self.sort2(self.sortedby)
 
-            if char_ord == curses.KEY_DC:  # delete
-                self.del_record(self.win.idx)
-            elif char_ord == curses.KEY_IC:  # insert
-                self.insert_record(self.win.idx)
-            elif self.win.handle_input(char_ord):
-                pass
-            elif char == 'e':
-                self.edit_record(self.win.idx)  # not using curses
-            elif char == 's':
-                self.filter.set()
-                self.search()
-            elif char == 'L':
-                self.run_url()
-            elif char == 'I':
-                self.import_html()
-            elif char == 'D':
-                self.show_deleted = not self.show_deleted
-                self.show_header()
-                self.sort2(self.sortedby)
-            elif char == 'U':
-                self.show_url()
-            elif char_ord == curses.KEY_F1:
-                win_help(self.win.win, HELP)
-                self.refresh_all()
-            elif char_ord == 12:  # ^L
-                self.url2clipboard()
-            elif char_ord == 20:  # ^T
-                self.title2clipboard()
-            elif char_ord == 7:  # ^G
-                self.tags2clipboard()
-            else:
+    def show_help(self):
+        win_help(self.win.win, HELP)
+        self.refresh_all()
+
+    def input_loop(self):
+        for char_ord in self.getch():
+            if char_ord in SCROLL_KEYS:
+                self.win.scroll(SCROLL_KEYS[char_ord] + self.pending_scroll())
+            elif f := self.keys.get(char_ord):
+                f()
+            elif not self.win.handle_input(char_ord):
                 name = curses.keyname(char_ord).decode('utf-8')
                 self.status(f'{char_ord=}, {name=}')
+            if self.win_deps_dirty:
+                self.update_win_deps()
+            curses.doupdate()
 
     def edit_record(self, i: int):
-        if (uuid := self.get_record(i)) and (r := self.db.get_by_uuid(uuid)):
+        if (uuid := self.get_record(i)) and (r := self.get_by_uuid(uuid)):
             pass
         else:
             return
         res = EDIT.NONE
         with escape2terminal(self):
             res = self.db.edit_record(r)
+        self.invalidate_record(uuid)  # r may be changed
         match res:
             case EDIT.NONE:
                 pass
             case EDIT.OK1:
-                self.win.refresh()
+                self.records_filter = None
+                self.win.redraw()
             case EDIT.OK2:
                 self.sort2(self.sortedby)
             case _:
@@ -373,12 +497,15 @@ class Main(App, ListProto3):  # pylint: disable=too-many-instance-attributes,too
         res = EDIT.NONE
         with escape2terminal(self):
             res = self.db.insert_record(r)
+        self.invalidate_record()  # an old record may be replaced
         match res:
             case EDIT.NONE:
                 pass
             case EDIT.OK1:
                 self.records.insert(i, r.uuid)
-                self.win.refresh()
+                self.index_records()
+                self.records_filter = None
+                self.win.redraw()
             case EDIT.OK2:
                 self.records.insert(i, r.uuid)
                 self.sort2(self.sortedby)
@@ -388,26 +515,24 @@ class Main(App, ListProto3):  # pylint: disable=too-many-instance-attributes,too
     def import_html(self):
         with escape2terminal(self):
             res = import_html(self.db)
+        self.invalidate_record()
         self.sort(self.sortedby)
-        self.win.refresh()
+        self.win.redraw()
         if res.ok:
             self.status(f'added: {res.added}, skipped: {res.skipped}')
         else:
             self.status(f'error: {res.line}: {res.error}')
 
 
-def record2win(r: Record | None, win):
-    if not r:
-        win.erase()
-        return
-    rows, cols = win.getmaxyx()
-    row = -1
+def record2lines(r: Record, rows: int, cols: int) -> list[str]:
+    'at most <rows> lines of record2str(r) wrapped to <cols>'
+    res: list[str] = []
     for line in record2str(r).splitlines():
         for s in chunkstring(line, cols):
-            row += 1
-            if not row < rows:
-                return
-            win_addstr(win, row, 0, s)
+            if not len(res) < rows:
+                return res
+            res.append(s)
+    return res
 
 
 def main2(db, screen):
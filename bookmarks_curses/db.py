@@ -1,17 +1,23 @@
 from __future__ import annotations
 
+import hashlib
 import io
 import os
+import re
 import subprocess
 import time
 from collections import deque
-from collections.abc import Callable, Generator, Iterable
-from contextlib import contextmanager
+from collections.abc import Callable, Generator, Iterable, Sequence
+from contextlib import closing, contextmanager
 from enum import IntEnum, StrEnum
+from functools import cache
 from sqlite3 import Cursor, OperationalError, connect
+from typing import ClassVar
 from uuid import uuid4
 
 from .file_utils import create_memfd2
+from .search_index import TokenIndex
+from .utils import FilterString, fold
 
 
 @contextmanager
@@ -23,62 +29,120 @@ def sqlite_db(fpath: str, replace=False) -> Generator[Db]:
             with open(fpath, 'wb'):
                 pass
         os.chmod(fpath, 0o600)
-    conn = connect(fpath, autocommit=False)
+    conn = connect(fpath, autocommit=False, cached_statements=CACHED_STATEMENTS)
+    # journal_mode can't be changed inside a transaction
+    conn.autocommit = True
+    for pragma in PRAGMAS:
+        conn.execute(f'pragma {pragma}')
+    conn.autocommit = False
     # conn.enable_load_extension(True)
     # conn.load_extension(sqlite_icu.extension_path().replace('.so', ''))
     db = Db(conn)
     yield db
-    db.close()
     conn.close()
 
 
 ERRORS = (OperationalError,)
 
+CACHED_STATEMENTS = 256  # sqlite3 default: 128
+RECORD_POOL_SIZE = 1024
+FETCH_ROWS = 256  # rows fetched at once by sort()
+MAX_VARS = 999  # SQLITE_MAX_VARIABLE_NUMBER of old SQLite versions
 
-class Record:  # pylint: disable=too-many-instance-attributes
-    title: str = ''
-    url: str = ''  # unique
-    tags: str = ''  # '#t1 #t2 ...'
-    notes: str = ''
+PRAGMAS = (
+    'journal_mode = wal',  # readers don't block writers, fewer fsyncs
+    'synchronous = normal',  # safe with wal
+    'temp_store = memory',
+    'cache_size = -64000',  # KiB
+    'mmap_size = 268435456',
+)
 
-    uuid: str = ''  # primary key
-    last_mod: int = 0  # time.time()
-    created: int = 0  # time.time()
-    deleted: int = 0  # time.time()
 
+class Record:  # pylint: disable=too-many-instance-attributes
     names = ('title', 'url', 'tags', 'notes', 'uuid', 'last_mod', 'created', 'deleted')
+    __slots__ = names
+
+    pool: ClassVar[deque[Record]] = deque(maxlen=RECORD_POOL_SIZE)  # released records, see acquire()
+
+    def __init__(  # pylint: disable=too-many-arguments,too-many-positional-arguments
+        self,
+        title: str = '',
+        url: str = '',  # unique
+        tags: str = '',  # '#t1 #t2 ...'
+        notes: str = '',
+        uuid: str = '',  # primary key
+        last_mod: int = 0,  # time.time()
+        created: int = 0,  # time.time()
+        deleted: int = 0,  # time.time()
+    ):
+        self.title = title
+        self.url = url
+        self.tags = tags
+        self.notes = notes
+
+        self.uuid = uuid
+        self.last_mod = last_mod
+        self.created = created
+        self.deleted = deleted
+
+    @staticmethod
+    def acquire() -> Record:
+        'empty record, reused if released'
+        try:
+            return Record.pool.pop()
+        except IndexError:
+            return Record()
+
+    def release(self):
+        'the record is not used anymore, see acquire()'
+        self.title = self.url = self.tags = self.notes = self.uuid = ''
+        self.last_mod = self.created = self.deleted = 0
+        Record.pool.append(self)
 
     @staticmethod
     def create() -> Record:
-        r = Record()
-        r.uuid = str(uuid4())
+        r = Record.acquire()
+        r.uuid = new_uuid()
         r.created = int(time.time())
         r.last_mod = r.created
         return r
 
-    def as_dict(self) -> dict:
-        return dict(
-            zip(
-                self.names,
-                [
-                    self.title,
-                    self.url,
-                    self.tags,
-                    self.notes,
-                    self.uuid,
-                    self.last_mod,
-                    self.created,
-                    self.deleted,
-                ],
-            )
+    def as_tuple(self) -> tuple:
+        'values in the order of names'
+        return (
+            self.title,
+            self.url,
+            self.tags,
+            self.notes,
+            self.uuid,
+            self.last_mod,
+            self.created,
+            self.deleted,
         )
 
     @staticmethod
     def from_tuple(t: tuple) -> Record:
-        r = Record()
+        'all fields are set so skip __init__'
+        r = Record.__new__(Record)
         r.title, r.url, r.tags, r.notes, r.uuid, r.last_mod, r.created, r.deleted = t
         return r
 
+    @staticmethod
+    def from_row_stream(cur: Cursor) -> Generator[Record]:
+        'records of the rows of executed <cur>, reused if released'
+        pool = Record.pool
+        new = Record.__new__
+        while rows := cur.fetchmany(FETCH_ROWS):
+            for t in rows:
+                r = pool.pop() if pool else new(Record)
+                r.title, r.url, r.tags, r.notes, r.uuid, r.last_mod, r.created, r.deleted = t
+                yield r
+
+
+def new_uuid() -> str:
+    'uuid of a new record, str(uuid4()) like the uuids already stored'
+    return str(uuid4())
+
 
 class MERGE(IntEnum):
     ERROR = 1
@@ -123,6 +187,44 @@ def is_sorted(key: str, sort: SORT) -> SORTED:
     return SORTED.NO
 
 
+def insert_sql(table: str, names: Sequence[str]) -> str:
+    names_s = ', '.join(names)
+    vars_s = ', '.join('?' * len(names))
+    return f'insert into {table} ({names_s}) values ({vars_s})'
+
+
+def update_sql(table: str, names: Iterable[str]) -> str:
+    names_s = ', '.join(f'{name} = ?' for name in names)
+    return f'update {table} set {names_s}'
+
+
+@cache
+def select_sql(table: str, names: tuple[str, ...], name: str) -> str:
+    'select <names> where <name> = value, built once per field'
+    names_s = ', '.join(names)
+    return f'select {names_s} from {table} where {name} = :{name}'
+
+
+@cache
+def sort_sql(table: str, names: tuple[str, ...], sort: SORT, deleted: bool) -> str:
+    names_s = ', '.join(names)
+    sql = f'select {names_s} from {table}'
+    if not deleted:
+        sql += ' where deleted = 0'
+    else:
+        sql += ' where deleted != 0'
+    match sort:
+        case SORT.LAST_MOD:
+            sql += ' order by last_mod desc'
+        case SORT.CREATED:
+            sql += ' order by created desc'
+        case SORT.TITLE:
+            sql += ' order by title_lower, last_mod desc'
+        case SORT.URL:
+            sql += ' order by url'
+    return sql
+
+
 class Db:
     table_name = 'bookmarks'
     create_sql = f'''\
@@ -135,48 +237,89 @@ create table if not exists {table_name} (
     last_mod integer,   -- time.time()
     created integer,    -- time.time()
     deleted integer,    -- time.time()
+    title_lower text,   -- fold(title) to sort by
     constraint bm_uuid primary key (uuid),
     constraint bm_url unique (url)
 );
-create index if not exists bm_last_mod on {table_name} (last_mod desc);
-create index if not exists bm_created on {table_name} (created desc);
-create index if not exists bm_title on {table_name} (lower(title) asc, last_mod desc);
 '''
+    # partial indexes for "deleted = 0" and "deleted != 0" of sort_sql(),
+    # uuid, deleted: sort_uuids() reads only the index (covering index)
+    index_sql = f'''\
+drop index if exists bm_last_mod;
+drop index if exists bm_created;
+drop index if exists bm_title;
+create index if not exists bm_last_mod_live on {table_name} (last_mod desc, uuid, deleted) where deleted = 0;
+create index if not exists bm_last_mod_deleted on {table_name} (last_mod desc, uuid, deleted) where deleted != 0;
+create index if not exists bm_created_live on {table_name} (created desc, uuid, deleted) where deleted = 0;
+create index if not exists bm_created_deleted on {table_name} (created desc, uuid, deleted) where deleted != 0;
+create index if not exists bm_title_live on {table_name}
+    (title_lower, last_mod desc, uuid, deleted) where deleted = 0;
+create index if not exists bm_title_deleted on {table_name}
+    (title_lower, last_mod desc, uuid, deleted) where deleted != 0;
+'''
+    columns = (*Record.names, 'title_lower')
+    # positional parameters: row()
+    sql_insert = insert_sql(table_name, columns)
+    sql_update = update_sql(table_name, columns) + ' where uuid = ?'
+    sql_delete = f'delete from {table_name} where uuid = ?'
+    sql_mark_del = f'update {table_name} set deleted = ? where uuid = ? and deleted = 0'
+    sql_delete_deleted = f'delete from {table_name} where uuid = ? and deleted != 0'
 
     def __init__(self, conn):
         self.conn = conn
-        self.cursors: deque[Cursor] = deque()
         self.error = None
+        self.index: TokenIndex | None = None  # created on first search
+        # url -> (uuid, last_mod, deleted), created on first use, see url_map()
+        self.urls: dict[str, tuple[str, int, int]] | None = None
+        self.uuid2url: dict[str, str] = {}
         self._create_table()
 
-    @contextmanager
-    def _cursor(self):
-        try:
-            cur = self.cursors.pop()  # last unused cursor
-        except IndexError:
-            cur = self.conn.cursor()
+    def commit(self) -> bool:
+        self.error = None
         try:
-            yield cur
-        finally:
-            self.cursors.append(cur)
+            self.conn.commit()
+            return True
+        except ERRORS as e:
+            self.error = e
+            self._rollback()
+        return False
 
-    def close(self):
-        try:
-            while self.cursors:
-                self.cursors.pop().close()
-        except IndexError:
-            pass
+    def _rollback(self):
+        self.conn.rollback()
+        self.index = None  # may be out of sync
+        self.urls = None
+        self.uuid2url = {}
 
     def _create_table(self):
-        with self._cursor() as cur:
+        with closing(self.conn.cursor()) as cur:
             cur.executescript(self.create_sql)
             self.conn.commit()
+            self._add_title_lower(cur)
+            self.conn.commit()
+            cur.executescript(self.index_sql)
+            self.conn.commit()
+
+    def _add_title_lower(self, cur: Cursor):
+        'table of an older version'
+        columns = {t[1] for t in cur.execute(f'pragma table_info({self.table_name})')}
+        if 'title_lower' in columns:
+            return
+        cur.execute(f'alter table {self.table_name} add column title_lower text')
+        rows = [
+            (fold(title or ''), uuid)
+            for title, uuid in cur.execute(f'select title, uuid from {self.table_name}').fetchall()
+        ]
+        cur.executemany(f'update {self.table_name} set title_lower = ? where uuid = ?', rows)
+
+    @staticmethod
+    def row(r: Record) -> tuple:
+        'values of columns'
+        return (*r.as_tuple(), fold(r.title))
 
     def get_by_field(self, name: str, value: str) -> Record | None:
-        names_s = ', '.join(Record.names)
-        sql = f'select {names_s} from {self.table_name} where {name} = :{name}'
+        sql = select_sql(self.table_name, Record.names, name)
         self.error = None
-        with self._cursor() as cur:
+        with closing(self.conn.cursor()) as cur:
             try:
                 res = cur.execute(sql, {name: value})
                 t = res.fetchone()
@@ -190,86 +333,205 @@ create index if not exists bm_title on {table_name} (lower(title) asc, last_mod
     def get_by_uuid(self, uuid: str) -> Record | None:
         return self.get_by_field('uuid', uuid)
 
-    def get_by_url(self, url: str) -> Record | None:
-        return self.get_by_field('url', url)
+    def url_map(self) -> dict[str, tuple[str, int, int]]:
+        'url -> (uuid, last_mod, deleted) of all records'
+        if self.urls is None:
+            sql = f'select url, uuid, last_mod, deleted from {self.table_name}'
+            with closing(self.conn.cursor()) as cur:
+                urls = {url: (uuid, last_mod, deleted) for url, uuid, last_mod, deleted in cur.execute(sql)}
+            self.urls = urls
+            self.uuid2url = {t[0]: url for url, t in urls.items()}
+        return self.urls
+
+    def get_url_info(self, url: str) -> tuple[str, int, int] | None:
+        '(uuid, last_mod, deleted) of the record with <url>, no query'
+        self.error = None
+        try:
+            return self.url_map().get(url)
+        except ERRORS as e:
+            self.error = e
+        return None
+
+    def get_by_uuids(self, uuids: list[str]) -> dict[str, Record]:
+        'uuid -> Record, one query per MAX_VARS <uuids>'
+        names_s = ', '.join(Record.names)
+        self.error = None
+        res: dict[str, Record] = {}
+        with closing(self.conn.cursor()) as cur:
+            try:
+                for i in range(0, len(uuids), MAX_VARS):
+                    chunk = uuids[i : i + MAX_VARS]
+                    vars_s = ', '.join('?' * len(chunk))
+                    sql = f'select {names_s} from {self.table_name} where uuid in ({vars_s})'
+                    for t in cur.execute(sql, chunk):
+                        r = Record.from_tuple(t)
+                        res[r.uuid] = r
+            except ERRORS as e:
+                self.error = e
+        return res
+
+    def _index_record(self, r: Record):
+        'r is inserted or updated'
+        if self.index is not None:
+            self.index.add(r.uuid, r.title, r.url, r.tags)
+        if self.urls is not None:
+            if (url := self.uuid2url.get(r.uuid)) is not None and url != r.url:
+                # URL changed
+                self.urls.pop(url, None)
+            self.urls[r.url] = (r.uuid, r.last_mod, r.deleted)
+            self.uuid2url[r.uuid] = r.url
+
+    def _unindex_record(self, uuid: str):
+        'record <uuid> is deleted'
+        if self.index is not None:
+            self.index.remove(uuid)
+        if self.urls is not None and (url := self.uuid2url.pop(uuid, None)) is not None:
+            self.urls.pop(url, None)
+
+    def _create_index(self) -> TokenIndex:
+        index = TokenIndex()
+        for deleted in (False, True):
+            for r in self.sort(SORT.LAST_MOD, deleted):
+                index.add(r.uuid, r.title, r.url, r.tags)
+                r.release()
+        return index
+
+    def search(self, filter_: FilterString) -> set[str] | None:
+        'uuids of records found by <filter_>, None: all records'
+        if not filter_.filter_string:
+            return None
+        if self.index is None:
+            index = self._create_index()
+            if self.error:
+                # incomplete
+                return index.search(filter_)
+            self.index = index
+        return self.index.search(filter_)
 
     def insert(self, r: Record, commit: bool) -> bool:
-        sql = insert_sql(self.table_name, Record.names)
         self.error = None
-        with self._cursor() as cur:
+        if not r.uuid:
+            # imported record, see merge_records()
+            r.uuid = new_uuid()
+        with closing(self.conn.cursor()) as cur:
             try:
-                cur.execute(f'{sql}', r.as_dict())
+                cur.execute(self.sql_insert, self.row(r))
                 if commit:
                     self.conn.commit()
+                self._index_record(r)
                 return True
             except ERRORS as e:
                 self.error = e
-                self.conn.rollback()
+                self._rollback()
         return False
 
     def update(self, r: Record, commit: bool) -> bool:
-        sql = update_sql(self.table_name, Record.names)
-        sql += ' where uuid = :uuid'
         self.error = None
-        with self._cursor() as cur:
+        with closing(self.conn.cursor()) as cur:
             try:
-                cur.execute(sql, r.as_dict())
+                cur.execute(self.sql_update, (*self.row(r), r.uuid))
                 if commit:
                     self.conn.commit()
+                self._index_record(r)
                 return True
             except ERRORS as e:
                 self.error = e
-                self.conn.rollback()
+                self._rollback()
         return False
 
     def del_by_uuid(self, uuid: str, commit: bool) -> bool:
-        sql = f'delete from {self.table_name} where uuid = :uuid'
-        with self._cursor() as cur:
+        with closing(self.conn.cursor()) as cur:
             try:
-                cur.execute(sql, {'uuid': uuid})
+                cur.execute(self.sql_delete, (uuid,))
                 if commit:
                     self.conn.commit()
+                self._unindex_record(uuid)
                 return True
             except ERRORS as e:
                 self.error = e
-                self.conn.rollback()
+                self._rollback()
         return False
 
     def mark_del(self, uuid: str, commit: bool) -> bool:
-        r = self.get_by_uuid(uuid)
-        if not r:
-            return True
-        if r.deleted:
-            return self.del_by_uuid(uuid, commit)
+        'mark as deleted, delete if already marked'
         deleted = int(time.time())
-        sql = f'update {self.table_name} set deleted = {deleted} where uuid = :uuid'
-        with self._cursor() as cur:
+        with closing(self.conn.cursor()) as cur:
             try:
-                cur.execute(sql, {'uuid': uuid})
+                cur.execute(self.sql_mark_del, (deleted, uuid))
+                marked = cur.rowcount > 0
+                removed = False
+                if not marked:
+                    # already marked or not found
+                    cur.execute(self.sql_delete_deleted, (uuid,))
+                    removed = cur.rowcount > 0
                 if commit:
                     self.conn.commit()
+                if removed:
+                    self._unindex_record(uuid)
+                elif marked and self.urls is not None and (url := self.uuid2url.get(uuid)):
+                    uuid_, last_mod, _ = self.urls[url]
+                    self.urls[url] = (uuid_, last_mod, deleted)
                 return True
             except ERRORS as e:
                 self.error = e
-                self.conn.rollback()
+                self._rollback()
         return False
 
-    def merge_record(self, r: Record) -> MERGE:
-        # r - record from external source
-        r2 = self.get_by_url(r.url)  # uuid is not relevant
-        if r2:
-            if r2.deleted > r.last_mod:
-                return MERGE.SKIP
-            if r2.last_mod < r.last_mod:
+    def get_merge_info(self, urls: list[str]) -> dict[str, tuple[str, int, int]]:
+        'url -> (uuid, last_mod, deleted) of existing <urls>'
+        urls_ = self.url_map()
+        return {i: t for i in urls if (t := urls_.get(i))}
+
+    def merge_records(self, rs: list[Record], commit: bool) -> list[MERGE]:
+        '''
+        records from an external source, a record replaces an older one with the same URL
+        unless that is deleted later
+        '''
+        self.error = None
+        try:
+            existing = self.get_merge_info(list({r.url for r in rs}))
+        except ERRORS as e:
+            self.error = e
+            self._rollback()
+            return [MERGE.ERROR] * len(rs)
+        res: list[MERGE] = []
+        deletes: list[str] = []  # uuids
+        inserts: dict[str, Record] = {}  # url -> record
+        for r in rs:
+            if r2 := existing.get(r.url):
+                uuid, last_mod, deleted = r2
+                if deleted > r.last_mod or last_mod >= r.last_mod:
+                    res.append(MERGE.SKIP)
+                    continue
                 # delete old r2
-                if not self.del_by_uuid(r2.uuid, False):
-                    return MERGE.ERROR
-            else:
-                # skip old r
-                return MERGE.SKIP
-        if not self.insert(r, True):
-            return MERGE.ERROR
-        return MERGE.OK
+                if r.url in inserts:
+                    # same URL earlier in rs
+                    del inserts[r.url]
+                else:
+                    deletes.append(uuid)
+            inserts[r.url] = r
+            existing[r.url] = (r.uuid, r.last_mod, r.deleted)
+            res.append(MERGE.OK)
+        rows = list(inserts.values())
+        for r in rows:
+            if not r.uuid:
+                # only records inserted get a uuid
+                r.uuid = new_uuid()
+        with closing(self.conn.cursor()) as cur:
+            try:
+                cur.executemany(self.sql_delete, [(i,) for i in deletes])
+                cur.executemany(self.sql_insert, [self.row(r) for r in rows])
+                if commit:
+                    self.conn.commit()
+            except ERRORS as e:
+                self.error = e
+                self._rollback()
+                return [MERGE.ERROR if i == MERGE.OK else i for i in res]
+        for uuid in deletes:
+            self._unindex_record(uuid)
+        for r in rows:
+            self._index_record(r)
+        return res
 
     def edit_record(self, r: Record) -> EDIT:
         try:
@@ -288,15 +550,15 @@ create index if not exists bm_title on {table_name} (lower(title) asc, last_mod
             if not self.update(r, True):
                 return EDIT.ERROR
             return EDIT.OK1
-        r2 = self.get_by_url(r.url)
-        if not r2:
+        t = self.get_url_info(r.url)
+        if not t:
             # slightly altered URL
             if not self.update(r, True):
                 return EDIT.ERROR
             return EDIT.OK1
         # rare case
         # r2 is older than r so delete it
-        res = self.del_by_uuid(r2.uuid, False) and self.update(r, True)
+        res = self.del_by_uuid(t[0], False) and self.update(r, True)
         if not res:
             return EDIT.ERROR
         return EDIT.OK2
@@ -310,40 +572,47 @@ create index if not exists bm_title on {table_name} (lower(title) asc, last_mod
     def _insert_record(self, r: Record) -> EDIT:
         if not edit_record(r):
             return EDIT.NONE
-        r2 = self.get_by_url(r.url)
-        if not r2:
+        t = self.get_url_info(r.url)
+        if not t:
             # most cases
             if not self.insert(r, True):
                 return EDIT.ERROR
             return EDIT.OK1
         # rare case
         # r2 is older than r so delete it
-        res = self.del_by_uuid(r2.uuid, False) and self.insert(r, True)
+        res = self.del_by_uuid(t[0], False) and self.insert(r, True)
         if not res:
             return EDIT.ERROR
         return EDIT.OK2
 
     def sort(self, sort: SORT, deleted: bool) -> Generator[Record]:
-        names_s = ', '.join(Record.names)
-        sql = f'select {names_s} from {self.table_name}'
-        if not deleted:
-            sql += ' where deleted = 0'
-        else:
-            sql += ' where deleted != 0'
-        match sort:
-            case SORT.LAST_MOD:
-                sql += ' order by last_mod desc'
-            case SORT.CREATED:
-                sql += ' order by created desc'
-            case SORT.TITLE:
-                sql += ' order by lower(title), last_mod desc'
-            case SORT.URL:
-                sql += ' order by url'
+        'records may be released after use'
+        sql = sort_sql(self.table_name, Record.names, sort, deleted)
         self.error = None
-        with self._cursor() as cur:
+        with closing(self.conn.cursor()) as cur:
             try:
-                for t in cur.execute(sql):
-                    yield Record.from_tuple(t)
+                yield from Record.from_row_stream(cur.execute(sql))
+            except ERRORS as e:
+                self.error = e
+
+    def sort_uuids(self, sort: SORT, deleted: bool, found: set[str] | None = None) -> Generator[str]:
+        'found: uuids to select (see search()), None: all'
+        self.error = None
+        if found is not None and not found:
+            return
+        sql = sort_sql(self.table_name, ('uuid',), sort, deleted)
+        with closing(self.conn.cursor()) as cur:
+            try:
+                cur.execute(sql)
+                while rows := cur.fetchmany(FETCH_ROWS):
+                    if found is None:
+                        # no filter
+                        for (uuid,) in rows:
+                            yield uuid
+                        continue
+                    for (uuid,) in rows:
+                        if uuid in found:
+                            yield uuid
             except ERRORS as e:
                 self.error = e
 
@@ -368,69 +637,66 @@ create index if not exists bm_title on {table_name} (lower(title) asc, last_mod
 
 
 def edit_record(r: Record) -> bool:
-    with create_memfd2('tmp') as (_, fpath):
-        record2file(r, fpath)
-        t1 = os.path.getmtime(fpath)
+    with create_memfd2('tmp') as (fd, fpath):
+        # vim reads and writes the same memfd
+        data = record2str(r).encode()
+        os.write(fd, data)
+        h1 = content_hash(data)
         subprocess.run(['vim', fpath], check=False)
-        t2 = os.path.getmtime(fpath)
-        if t1 != t2:
-            file2record(fpath, r)  # r changed
+        data = os.pread(fd, os.fstat(fd).st_size, 0)
+        # mtime may change without changes (:w, autowrite)
+        if content_hash(data) != h1:
+            # universal newlines as in text files
+            with io.StringIO(data.decode('utf-8'), newline=None) as fp:
+                dict2record(stream2dict(fp), r)  # r changed
             return True
     return False
 
 
-def file2record(fpath: str, r: Record):
-    d = file2dict(fpath)
+def content_hash(data: bytes) -> bytes:
+    return hashlib.blake2b(data, digest_size=16).digest()
+
+
+def dict2record(d: dict, r: Record):
     r.url = d['url']
     r.title = d['title']
     r.tags = d['tags']
     r.notes = d['notes'].rstrip()
 
 
-def file2dict(fpath: str) -> dict:
-    with open(fpath, 'r', encoding='utf-8') as fp:
-        return stream2dict(fp)
-
-
 def stream2dict(fp) -> dict:
-    steps = []
-    for id_, s, _, type_ in FIELDS:
-        steps.append((f'{s}:\n', id_, type_))
+    text = fp.read()
     d = {}
-    step = 0
-    read_value = 0
-    for line in fp:
-        s, id_, type_ = steps[step]
-        if read_value == 1:
-            d[id_] = line.rstrip()
-            read_value = 0
-            step += 1
-            if step >= len(steps):
-                break
-            continue
-        if read_value == 2:
+    pos = 0
+    for id_, regex, type_ in FIELD_HEADERS:
+        # fields in order, other lines are skipped
+        if not (m := regex.search(text, pos)):
+            break
+        pos = m.end()
+        if type_ == 2:
             # read lines to the end
-            d[id_] += line.rstrip() + '\r\n'
-            continue
-        if line != s:
-            continue
-        if id_ not in d:
-            d[id_] = ''
-        read_value = type_
+            s = text[pos:]
+            if s and not s.endswith('\n'):
+                s += '\n'
+            d[id_] = LINE_END_RE.sub('\r\n', s)
+            break
+        # value is the next line
+        if (end := text.find('\n', pos)) < 0:
+            end = len(text)
+        d[id_] = text[pos:end].rstrip()
+        pos = end + 1
     return d
 
 
-def record2file(r: Record, fpath: str):
-    with open(fpath, 'w', encoding='utf-8') as fp:
-        record2stream(fp, r)
+# stored notes have no lone \r: lines are read with universal newlines
+# and joined with \r\n, see stream2dict()
+NOTES_TABLE = str.maketrans({'\r': None, '\t': ' ' * 4})
 
 
 def notes2str(r: Record) -> str:
-    s = ''
-    if r.notes:
-        s = r.notes.rstrip().replace('\r\n', '\n')
-        s = s.replace('\t', ' ' * 4)
-    return s
+    if not r.notes:
+        return ''
+    return r.notes.rstrip().translate(NOTES_TABLE)
 
 
 FIELDS: list[tuple[str, str, Callable[[Record], str], int]] = [
@@ -441,6 +707,11 @@ FIELDS: list[tuple[str, str, Callable[[Record], str], int]] = [
     ('notes', 'Notes', notes2str, 2),
 ]
 
+# id, 'title:' line, type
+FIELD_HEADERS = [(id_, re.compile(f'^{re.escape(s)}:\n', re.MULTILINE), type_) for id_, s, _, type_ in FIELDS]
+
+LINE_END_RE = re.compile(r'[^\S\n]*\n')  # rstrip of every line
+
 
 def record2str(r: Record) -> str:
     with io.StringIO() as fp:
@@ -456,18 +727,3 @@ def record2stream(fp, r: Record):
         else:
             fp.write('\n')
         fp.write(f'{s}:\n{f(r)}\n')
-
-
-def names2vars(names: Iterable[str]) -> list[str]:
-    return [f':{i}' for i in names]
-
-
-def insert_sql(table: str, names: Iterable[str]) -> str:
-    names_s = ', '.join(names)
-    vars_s = ', '.join(names2vars(names))
-    return f'insert into {table} ({names_s}) values ({vars_s})'
-
-
-def update_sql(table: str, names: Iterable[str]) -> str:
-    names_s = ', '.join(f'{name} = :{name}' for name in names)
-    return f'update {table} set {names_s}'
@@ -6,6 +6,8 @@ from collections import deque
 from .db import MERGE, Db, Record
 from .file_utils import input_file
 
+MERGE_RECORDS = 500  # records merged (and committed) at once
+
 
 class Import:
     ok: bool = False
@@ -41,37 +43,49 @@ def import_html(db: Db) -> Import:
 
 def import_html_dp(db: Db, fpath: str) -> Import:
     res = Import()
-    with open(fpath, 'r', encoding='utf-8') as fp:
-        import_html2(db, res, fp)
+    # one transaction instead of one per record
+    try:
+        with open(fpath, 'r', encoding='utf-8') as fp:
+            import_html2(db, res, fp)
+    finally:
+        # records merged before an error are kept
+        if not db.commit() and res.ok:
+            res.ok = False
+            res.error = f'commit error: {db.error}'
     return res
 
 
-def import_html2(db: Db, res: Import, fp: io.TextIOBase):  # pylint: disable=too-many-branches
+def import_html2(db: Db, res: Import, fp: io.TextIOBase):
     rq: deque[Record] = deque()  # last record to insert
-
-    def check_prev_record() -> bool:
-        if rq:
-            r = rq.pop()
-            r.notes = r.notes.rstrip()
-            match db.merge_record(r):
+    batch: list[Record] = []  # records to merge
+
+    def merge_batch() -> bool:
+        results = db.merge_records(batch, False) if batch else []
+        for r in batch:
+            r.release()
+        batch.clear()
+        for m in results:
+            match m:
                 case MERGE.ERROR:
                     res.error = 'merge error'
                     return False
                 case MERGE.SKIP:
                     res.skipped += 1
-                    return True
                 case MERGE.OK:
                     res.added += 1
-                    return True
+        if results and not db.commit():
+            res.error = f'commit error: {db.error}'
+            return False
         return True
 
-    def is_a(line: str) -> bool:
-        # <DT><A HREF="..." LAST_VISIT="1761579546" ADD_DATE="1761579546" PRIVATE="0" TAGS="fun,db">...title...</A>
-        # return line.startswith('<DT><A ') and line.endswith('</A>')
-        return line.startswith('<DT><A ')
-
-    def is_eof(line: str) -> bool:
-        return line.startswith('</DL>')
+    def check_prev_record() -> bool:
+        if rq:
+            r = rq.pop()
+            r.notes = r.notes.rstrip()
+            batch.append(r)
+            if len(batch) >= MERGE_RECORDS:
+                return merge_batch()
+        return True
 
     def next_record(line: str) -> Record | None:
         if check_prev_record():
@@ -81,86 +95,100 @@ def import_html2(db: Db, res: Import, fp: io.TextIOBase):  # pylint: disable=too
                 return r
         return None
 
-    step = 0
-    for line in fp:
-        line = line.rstrip()
-        res.line += 1
-        match step:
-            case 0:
-                if not is_a(line):
-                    continue
-                r = next_record(line)
-                if not r:
-                    break
-                step = 1
-            case 1:
-                # <DD>...
-                if line.startswith('<DD>'):
-                    r.notes = f'{line[4:]}\n'  # type: ignore[union-attr]
-                    step = 2
-                    continue
-                if not is_a(line):
-                    # </DL><p>
-                    if is_eof(line):
-                        # end of file
-                        continue
-                    res.error = 'bad line'
-                    break
-                r = next_record(line)
-                if not r:
-                    break
-                step = 1
-            case 2:
-                # append to notes
-                if not is_a(line):
-                    # </DL><p>
-                    if is_eof(line):
-                        # end of file
-                        continue
-                    r.notes += f'{line}\n'  # type: ignore[union-attr]
-                    continue
-                r = next_record(line)
-                if not r:
-                    break
-                step = 1
+    def add_lines(end: int) -> bool:
+        'lines of the last record after its DT line (text[pos:end])'
+        if rq and (i := add_notes(rq[-1], text[pos + 1 : end])) >= 0:
+            res.line += i + 1
+            res.error = 'bad line'
+            return False
+        return True
+
+    text = fp.read()
+    pos = 0  # end of the last DT line
+    res.line = 1
+    for m in DT_LINE_RE.finditer(text):
+        if not add_lines(start := m.start()):
+            break
+        res.line += text.count('\n', pos, start)
+        if not next_record(m.group().rstrip()):
+            break
+        pos = m.end()
     else:
-        if not check_prev_record():
-            return
-        res.ok = True
+        if add_lines(len(text)):
+            # lines read
+            res.line = text.count('\n') + (text[-1:] not in ('', '\n'))
+            res.ok = check_prev_record()
+    # records before an error are merged too
+    if not merge_batch():
+        res.ok = False
+
+
+def add_notes(r: Record, s: str) -> int:
+    '''
+    <DD>notes and the following lines (s) -> r.notes,
+    return index of a bad line or -1
+    '''
+    if not s:
+        # most records
+        return -1
+    lines = s.split('\n')
+    if not lines[-1]:
+        # s ends with a newline
+        lines.pop()
+    # </DL><p>: end of file
+    notes = [j for i in lines if (j := i.rstrip())[:5] != '</DL>']
+    if not notes:
+        return -1
+    if notes[0][:4] != '<DD>':
+        # the first line after </DL> lines
+        return next(i for i, line in enumerate(lines) if line.rstrip()[:5] != '</DL>')
+    notes[0] = notes[0][4:]
+    notes.append('')
+    r.notes = '\n'.join(notes)
+    return -1
+
+
+# a line that starts with '<DT><A ' after rstrip()
+DT_LINE_RE = re.compile(r'^<DT><A (?=[^\n]*\S)[^\n]*', re.MULTILINE)
+
+# <DT><A HREF="..." LAST_VISIT="1761579546" ADD_DATE="1761579546" PRIVATE="0" TAGS="fun,db">...title...</A>
+# values don't start with '>': the title follows the first '">' (see DT_FIELDS)
+DT_RE = re.compile(
+    r'<DT><A HREF="((?!>)[^"]*)" LAST_VISIT="([0-9]+)" ADD_DATE="([0-9]+)" '
+    r'PRIVATE="(?!>)[^"]*" TAGS="((?!>)[^"]*)">(.*)</A>'
+)
+
+# other attributes or their order: search every field
+DT_FIELDS = [
+    (re.compile(r' HREF="([^"]*)" '), 'HREF not found'),
+    (re.compile(r' LAST_VISIT="([0-9]+)" '), 'LAST_VISIT not found'),
+    (re.compile(r' ADD_DATE="([0-9]+)" '), 'ADD_DATE not found'),
+    (re.compile(r' TAGS="([^"]*)">'), 'TAGS not found'),
+    (re.compile(r'">(.*)</A>'), 'A-body not found'),
+]
 
 
 def dt2record(line: str, res: Import) -> tuple[Record, bool]:
-    r = Record.create()
-    m = re.search(r' HREF="([^"]*)" ', line)
-    if not m:
-        res.error = 'HREF not found'
-        return (r, False)
-    r.url = m.group(1)
-
-    m = re.search(r' LAST_VISIT="([0-9]+)" ', line)
-    if not m:
-        res.error = 'LAST_VISIT not found'
-        return (r, False)
-    r.last_mod = int(m.group(1))
-
-    m = re.search(r' ADD_DATE="([0-9]+)" ', line)
-    if not m:
-        res.error = 'ADD_DATE not found'
-        return (r, False)
-    r.created = int(m.group(1))
-
-    m = re.search(r' TAGS="([^"]*)">', line)
-    if not m:
-        res.error = 'TAGS not found'
-        return (r, False)
+    # uuid is set on insert, most records of a repeated import are skipped
+    r = Record.acquire()
+    if m := DT_RE.fullmatch(line):
+        fields = m.groups()
+    else:
+        fields2 = []
+        for regex, error in DT_FIELDS:
+            if not (m := regex.search(line)):
+                res.error = error
+                return (r, False)
+            fields2.append(m.group(1))
+        fields = tuple(fields2)
+    url, last_mod, created, tags, title = fields
+
+    r.url = url
+    r.last_mod = int(last_mod)
+    r.created = int(created)
     # tags: #tag1 #tag2 ...
-    r.tags = ' '.join(f'#{i}' for i in m.group(1).split(',') if i)
-
-    m = re.search(r'">(.*)</A>', line)
-    if not m:
-        res.error = 'A-body not found'
-        return (r, False)
-    r.title = m.group(1).strip()
+    r.tags = ' '.join(f'#{i}' for i in tags.split(',') if i)
+    r.title = title.strip()
     r.title = r.title.lstrip('‎')
 
     return (r, True)
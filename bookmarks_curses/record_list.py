@@ -0,0 +1,181 @@
+import curses
+from collections.abc import Generator, Iterable, Sequence
+from typing import Protocol, cast
+
+from curses_utils2.list3 import List3, ListProto3
+
+
+class RecordListProto(ListProto3, Protocol):
+    def get_record_str_batch(self, start: int, count: int) -> list[Sequence[str]]:
+        'lines of records start..start+count-1 (fewer at the end)'
+
+
+class RecordList(List3):
+    '''
+    List3 that only marks its windows for update (noutrefresh),
+    the caller is responsible for curses.doupdate()
+    '''
+
+    proto: RecordListProto
+
+    def __init__(self, *args, **kwargs):
+        super().__init__(*args, **kwargs)
+        self.last_render: tuple | None = None  # see state()
+        self.keys = {  # key -> handler
+            curses.KEY_DOWN: self.scroll_down,
+            ord('j'): self.scroll_down,
+            ord('J'): self.scroll_down,
+            curses.KEY_UP: self.scroll_up,
+            ord('k'): self.scroll_up,
+            ord('K'): self.scroll_up,
+            curses.KEY_HOME: self.scroll_top,
+            ord('g'): self.scroll_top,
+            curses.KEY_END: self.scroll_bottom,
+            ord('G'): self.scroll_bottom,
+            curses.KEY_NPAGE: self.scroll_page_down,
+            curses.KEY_PPAGE: self.scroll_page_up,
+        }
+
+    def addstr(self, i: int, g: Iterable[str], attr: int = 0):
+        'g: lines of a record, get_record_str() or get_record_str_batch()'
+        super().addstr(i, cast(Generator[str], g), attr=attr)
+
+    def handle_input(self, ch: int) -> bool:
+        if not (f := self.keys.get(ch)):
+            return False
+        f()
+        return True
+
+    def state(self, len_: int) -> tuple:
+        'what is shown in the window'
+        return (self.idx, self.cur, len_, self.win.getmaxyx())
+
+    def redraw(self):
+        'refresh even if nothing changed'
+        self.last_render = None
+        self.refresh()
+
+    def refresh(self):
+        len_ = self.proto.records_len()
+        rows, _ = self.win.getmaxyx()
+        rows //= self.height
+        if len_:
+            if not self.idx < len_:  # deleted
+                self.idx = len_ - 1
+            if (rows - self.cur) > (di := len_ - self.idx):
+                # gap at bottom
+                self.cur = rows - di
+            self.cur = min(self.cur, self.idx)
+        if (state := self.state(len_)) == self.last_render:
+            return
+        last, self.last_render = self.last_render, state
+        if len_ and last and last[2:] == state[2:]:
+            # same records and window, the window top moved by <shift>
+            shift = (self.idx - self.cur) - (last[0] - last[1])
+            if abs(shift) < rows:
+                self.scroll_rows(shift, last[1] - shift, rows, len_)
+                self.win.noutrefresh()
+                self.proto.refresh_win_deps()
+                return
+        self.win.erase()
+        if len_:
+            batch = self.proto.get_record_str_batch(self.idx - self.cur, rows)
+            for i, s in enumerate(batch):
+                if i == self.cur:
+                    self.addstr(i, s, attr=self.current_color)
+                else:
+                    self.addstr(i, s)
+            self.win.move(self.cur * self.height, 0)
+        self.win.noutrefresh()
+        self.proto.refresh_win_deps()
+
+    def scroll_rows(self, shift: int, prev_cur: int, rows: int, len_: int):
+        '''
+        scroll window lines by <shift> rows and draw only the rows exposed,
+        the previous (prev_cur) and the current cursor rows
+        '''
+        if shift:
+            self.win.scrollok(True)
+            self.win.scroll(shift * self.height)
+            self.win.scrollok(False)
+            # lines below the last row stay empty
+            maxy, _ = self.win.getmaxyx()
+            for y in range(rows * self.height, maxy):
+                self.win.move(y, 0)
+                self.win.clrtoeol()
+        exposed = range(rows - shift, rows) if shift > 0 else range(-shift)
+        top = self.idx - self.cur
+        batch = self.proto.get_record_str_batch(top + exposed.start, len(exposed))
+        lines: dict[int, Iterable[str]] = dict(zip(exposed, batch))
+        draw = set(exposed)
+        if 0 <= prev_cur < rows:
+            draw.add(prev_cur)
+        draw.add(self.cur)
+        for i in sorted(draw):
+            if not (idx := top + i) < len_:
+                break
+            if (s := lines.get(i)) is None:
+                s = self.proto.get_record_str(idx)
+            if i == self.cur:
+                self.addstr(i, s, attr=self.current_color)
+            else:
+                self.addstr(i, s)
+        self.win.move(self.cur * self.height, 0)
+
+    def scroll_down(self):
+        len_ = self.proto.records_len()
+        if not len_ or not self.idx + 1 < len_:
+            return
+        rows, _ = self.win.getmaxyx()
+        rows //= self.height
+        prev_s = self.proto.get_record_str(self.idx)
+        next_s = self.proto.get_record_str(self.idx + 1)
+        self.addstr(self.cur, prev_s)
+        if self.cur + 1 < rows:
+            self.cur += 1
+        else:
+            self.win.move(0, 0)
+            self.win.deleteln()
+            self.win.deleteln()
+            self.cur = rows - 1
+        self.addstr(self.cur, next_s, attr=self.current_color)
+        self.idx += 1
+        self.last_render = self.state(len_)
+        self.win.noutrefresh()
+        self.proto.refresh_win_deps()
+
+    def scroll_up(self):
+        len_ = self.proto.records_len()
+        if not len_ or self.idx - 1 < 0:
+            return
+        prev_s = self.proto.get_record_str(self.idx)
+        next_s = self.proto.get_record_str(self.idx - 1)
+        self.addstr(self.cur, prev_s)
+        if self.cur > 0:
+            self.cur -= 1
+        else:
+            self.win.move(0, 0)
+            self.win.insdelln(self.height)
+        self.addstr(self.cur, next_s, attr=self.current_color)
+        self.idx -= 1
+        self.last_render = self.state(len_)
+        self.win.noutrefresh()
+        self.proto.refresh_win_deps()
+
+    def scroll(self, delta: int):
+        'move selection by <delta> records'
+        if delta == 1:
+            self.scroll_down()
+            return
+        if delta == -1:
+            self.scroll_up()
+            return
+        len_ = self.proto.records_len()
+        if not len_ or not delta:
+            return
+        rows, _ = self.win.getmaxyx()
+        rows //= self.height
+        idx = min(max(self.idx + delta, 0), len_ - 1)
+        self.cur = min(max(self.cur + idx - self.idx, 0), rows - 1)
+        self.idx = idx
+        self.refresh()
@@ -0,0 +1,102 @@
+from bisect import bisect_right
+
+from .utils import FilterString, fold
+
+
+class TokenIndex:
+    '''
+    token (case folded word of title, URL or tags) -> uuids
+
+    Search words do not contain whitespace, so a word found in a record
+    is always a substring of one of its tokens.
+    All tokens are joined into one UTF-8 text to find a word with bytes.find:
+    a non-ASCII token would widen a str text to 2-4 bytes per char
+    '''
+
+    def __init__(self):
+        self.tokens: dict[str, set[str]] = {}  # token -> uuids
+        self.tags: dict[str, set[str]] = {}  # tag -> uuids
+        self.uuids: dict[str, tuple[set[str], set[str]]] = {}  # uuid -> (tokens, tags)
+
+        # '\n'.join(vocab), rebuilt on search if tokens changed
+        self.vocab: list[str] = []
+        self.starts: list[int] = []  # start of every vocab token in text
+        self.text = b''
+        self.text_dirty = False
+
+    def add(self, uuid: str, title: str, url: str, tags: str):
+        self.remove(uuid)
+        # fields are normalized once here, not on every search
+        tags_ = set(fold(tags).split())
+        tokens = set(fold(f'{title} {url}').split())
+        tokens.update(tags_)
+        self.uuids[uuid] = (tokens, tags_)
+        for token in tokens:
+            if (uuids := self.tokens.get(token)) is None:
+                self.tokens[token] = {uuid}
+                self.text_dirty = True
+            else:
+                uuids.add(uuid)
+        for tag in tags_:
+            self.tags.setdefault(tag, set()).add(uuid)
+
+    def remove(self, uuid: str):
+        if (t := self.uuids.pop(uuid, None)) is None:
+            return
+        tokens, tags = t
+        for token in tokens:
+            uuids = self.tokens[token]
+            uuids.discard(uuid)
+            if not uuids:
+                del self.tokens[token]
+                self.text_dirty = True
+        for tag in tags:
+            uuids = self.tags[tag]
+            uuids.discard(uuid)
+            if not uuids:
+                del self.tags[tag]
+
+    def _build_text(self):
+        self.vocab = list(self.tokens)
+        encoded = [i.encode() for i in self.vocab]
+        self.starts = []
+        pos = 0
+        for token in encoded:
+            self.starts.append(pos)
+            pos += len(token) + 1
+        self.text = b'\n'.join(encoded)
+        self.text_dirty = False
+
+    def find(self, word: str) -> set[str]:
+        'uuids of records with <word> in any token'
+        if self.text_dirty:
+            self._build_text()
+        res: set[str] = set()
+        text = self.text
+        starts = self.starts
+        # a UTF-8 word matches at char boundaries only
+        word_ = word.encode()
+        pos = text.find(word_)
+        while pos >= 0:
+            i = bisect_right(starts, pos) - 1
+            res.update(self.tokens[self.vocab[i]])
+            # skip the rest of the token
+            if not i + 1 < len(starts):
+                break
+            pos = text.find(word_, starts[i + 1])
+        return res
+
+    def search(self, filter_: FilterString) -> set[str]:
+        res: set[str] | None = None
+        # long words are found less often
+        for word in sorted(filter_.words, key=len, reverse=True):
+            uuids = self.find(word)
+            res = uuids if res is None else res & uuids
+            if not res:
+                return set()
+        if res is None:
+            res = set(self.uuids)
+        for tag in filter_.exclude_tags:
+            if tag_uuids := self.tags.get(tag):
+                res -= tag_uuids
+        return res
@@ -1,3 +1,6 @@
+from __future__ import annotations
+
+from collections import OrderedDict
 from collections.abc import Generator
 from datetime import datetime
 from subprocess import PIPE, Popen
@@ -26,18 +29,19 @@ class RowString:
 
     def __init__(self, *widths: int):
         self.widths = widths
+        # '{:<w.w} ' for every width, '{}' for 0 (last value)
+        fields = [f'{{:<{w}.{w}}} ' if w else '{}' for w in widths]
+        # values may be fewer than widths: template for every number of values
+        self.formats = [''.join(fields[:i]) for i in range(len(widths) + 1)]
 
     def value(self, *values: str):
-        # min_ = min(len(self.widths), len(values))
-        s = ''
-        for w, v in zip(self.widths, values):
-            if not w:
-                # last value
-                s += v
-            else:
-                s += f'{v[:w]:<{w}} '
-        s = s.rstrip()  # last item stripped
-        return s
+        n = min(len(self.widths), len(values))
+        return self.formats[n].format(*values).rstrip()  # last item stripped
+
+
+def fold(s: str) -> str:
+    'normalized case of search words and record fields'
+    return s.casefold()
 
 
 def str2clipboard(s: str):
@@ -51,18 +55,37 @@ class FilterString:
 
     def set(self, s: str = ''):
         self.filter_string = s
-        words = {i.lower() for i in s.split()}
+        words = set(fold(s).split())
         exclude_tags = {i for i in words if i.startswith('-#')}
         self.exclude_tags = {i[1:] for i in exclude_tags}
         self.words = words - exclude_tags
 
-    def found(self, *fields: str, tags: str = '') -> bool:
-        if not self.filter_string:
+    def narrows(self, other: FilterString) -> bool:
+        'records found by self are found by <other> too'
+        if not other.filter_string:
             return True
-        low_fields = {i.lower() for i in fields}
-        if tags:
-            low_fields.add(tags.lower())
-            words = {i.lower() for i in tags.split()}
-            if any(i in words for i in self.exclude_tags):
-                return False
-        return all(any(f2.find(s) >= 0 for f2 in low_fields) for s in self.words)
+        if not other.exclude_tags <= self.exclude_tags:
+            return False
+        # every word of <other> is a part of some word of self
+        return all(any(i in j for j in self.words) for i in other.words)
+
+
+class LruCache(OrderedDict):
+    'dict with at most <maxsize> recently used items'
+
+    def __init__(self, maxsize: int):
+        super().__init__()
+        self.maxsize = maxsize
+
+    def get(self, key, default=None):
+        try:
+            self.move_to_end(key)
+        except KeyError:
+            return default
+        return self[key]
+
+    def put(self, key, value):
+        self[key] = value
+        self.move_to_end(key)
+        if len(self) > self.maxsize:
+            self.popitem(last=False)